@@ -1,6 +1,6 @@
 import sys
+import threading
 import time
-from collections import deque
 import numpy as np
 
 # --- Dépendances série & plot ---
@@ -11,13 +11,36 @@ except Exception as e:
     print("❌ PySerial est requis. Installe-le avec:  pip install pyserial")
     raise
 
+try:
+    from scipy.ndimage import uniform_filter1d
+    from scipy.signal import lfilter, lfilter_zi
+except Exception as e:
+    print("❌ SciPy est requis. Installe-le avec:  pip install scipy")
+    raise
+
+# Numba est optionnel : sans lui on retombe sur la version numpy
+try:
+    from numba import njit
+    HAVE_NUMBA = True
+except Exception:
+    HAVE_NUMBA = False
+
 import matplotlib.pyplot as plt
 
 # ---------- Paramètres ----------
 PORT_PREFERER = "COM7"     # port préféré si connu (modifiable)
 BAUDRATE = 115200
+# Format d'envoi du micro : "ascii" (un flottant par ligne) ou "u16"
+# (échantillons ADC uint16 little-endian, 2 octets au lieu de ~6 ASCII,
+# et aucun décodage/parse de texte côté hôte)
+WIRE_FORMAT = "ascii"
+ADC_VREF = 3.3             # tension pleine échelle (V) pour le format u16
+ADC_MAX = 4095             # valeur ADC pleine échelle (12 bits)
+READ_BATCH = 16            # échantillons visés par lecture série bloquante
 FS = 200                   # fréquence d'échantillonnage visée (Hz)
 BUFFER_POINTS = 500       # points visibles sur le graphe
+DRAW_FPS = 30              # cadence max de rafraîchissement du tracé (Hz)
+DISPLAY_MAX_POINTS = 1000  # sommets max envoyés au tracé (décimation min/max au-delà)
 
 # Lissage
 SMOOTH_MODE = "iir"        # 'iir' ou 'ma'
@@ -47,12 +70,40 @@ class Smoother:
         self.alpha = max(0.0, min(1.0, alpha))
         self.ma_window = max(1, int(ma_window))
         self._y = None
-        self._buf = deque(maxlen=self.ma_window)
+        # fenêtre MA préallouée + somme courante : push() en O(1),
+        # sans deque ni sum() Python par échantillon
+        self._ma_buf = np.zeros(self.ma_window)
+        self._ma_sum = 0.0
+        self._ma_i = 0
+        self._ma_n = 0
+        # coefficients lfilter : IIR du 1er ordre ou moyenne glissante FIR
+        if self.mode == "ma":
+            self._b = np.ones(self.ma_window) / self.ma_window
+            self._a = np.array([1.0])
+        else:
+            self._b = np.array([self.alpha])
+            self._a = np.array([1.0, -(1.0 - self.alpha)])
+        self._zi = None
+
+    def push_batch(self, arr):
+        """Filtre un lot entier en une passe C (état conservé entre lots)."""
+        if arr.size == 0:
+            return arr
+        if self._zi is None:
+            # démarrer le filtre sur la première valeur, comme push()
+            self._zi = lfilter_zi(self._b, self._a) * arr[0]
+        out, self._zi = lfilter(self._b, self._a, arr, zi=self._zi)
+        return out
 
     def push(self, x):
         if self.mode == "ma":
-            self._buf.append(x)
-            return sum(self._buf) / len(self._buf)
+            i = self._ma_i
+            self._ma_sum += x - self._ma_buf[i]
+            self._ma_buf[i] = x
+            self._ma_i = (i + 1) % self.ma_window
+            if self._ma_n < self.ma_window:
+                self._ma_n += 1
+            return self._ma_sum / self._ma_n
         if self._y is None:
             self._y = x
         else:
@@ -60,13 +111,70 @@ class Smoother:
         return self._y
 
 
+def minmax_decimate(y, max_points):
+    """Décime un signal pour l'affichage en préservant la forme des pics.
+
+    Chaque bin de k échantillons émet sa paire (min, max) : l'écran n'a
+    que ~1000 px de large, inutile d'envoyer plus de sommets à Agg.
+    Retourne y inchangé s'il tient déjà dans max_points.
+    """
+    n = y.size
+    if n <= max_points:
+        return y
+    k = -(-2 * n // max_points)  # échantillons par bin (2 points émis par bin)
+    nb = n // k
+    bins = y[:nb * k].reshape(nb, k)
+    out = np.empty(2 * nb)
+    out[0::2] = bins.min(axis=1)
+    out[1::2] = bins.max(axis=1)
+    return out
+
+
+class RingBuffer:
+    """Anneau contigu : les N derniers échantillons sont toujours une vue.
+
+    Le tableau fait 2N ; on écrit séquentiellement et on recompacte
+    seulement en fin de tableau, donc fenêtre glissante en O(1) amorti
+    et zéro copie pour la lecture (contrairement au décalage y[:-k]=y[k:]).
+    """
+
+    def __init__(self, n, fill=np.nan):
+        self.n = n
+        self._buf = np.full(2 * n, fill, dtype=np.float64)
+        self._w = n  # index d'écriture, toujours dans [n, 2n]
+
+    def extend(self, arr):
+        k = arr.size
+        if k >= self.n:
+            self._buf[:self.n] = arr[-self.n:]
+            self._w = self.n
+            return
+        if self._w + k > 2 * self.n:
+            # recompacter : ramener la fenêtre courante en tête de tableau
+            self._buf[:self.n] = self._buf[self._w - self.n:self._w]
+            self._w = self.n
+        self._buf[self._w:self._w + k] = arr
+        self._w += k
+
+    def view(self):
+        """Vue contiguë (sans copie) sur les N derniers échantillons."""
+        return self._buf[self._w - self.n:self._w]
+
+
 def open_serial():
     port = detect_port()
     if not port:
         print("❌ Aucun port série détecté. Branche la carte puis réessaie.")
         sys.exit(1)
     try:
-        ser = serial.Serial(port, BAUDRATE, timeout=0.1)
+        # timeout calibré sur un lot : read() bloque jusqu'à l'arrivée des
+        # octets (ou l'échéance) au lieu de scruter le port
+        ser = serial.Serial(port, BAUDRATE, timeout=READ_BATCH / FS * 1.5)
+        try:
+            # agrandir le buffer de réception de l'OS (API Windows uniquement)
+            ser.set_buffer_size(rx_size=1 << 16)
+        except Exception:
+            pass
         print(f"✅ Connecté sur {port} @ {BAUDRATE} bauds")
         return ser
     except serial.SerialException as e:
@@ -81,10 +189,14 @@ def setup_plot():
     y = np.full(BUFFER_POINTS, np.nan)
 
     color = (0.08, 0.65, 0.08)
-    line = ax.plot(x, y, lw=2, color=color, label="line")[0]
-    points = ax.plot(x, y, linestyle="None", marker="o", markersize=4, color=color, alpha=0.9, label="points")[0]
+    line = ax.plot(x, y, lw=2, color=color, label="line", animated=True)[0]
+    points = ax.plot(x, y, linestyle="None", marker="o", markersize=4, color=color, alpha=0.9, label="points",
+                     animated=True)[0]
 
     ax.set_title("ECG (lissé) - BPM: -- | Filtre: ON | Mode: line")
+    # titre animé : repeint par blit, le fond n'est plus invalidé à chaque
+    # mise à jour du BPM
+    ax.title.set_animated(True)
     ax.set_xlabel("Échantillons")
     ax.set_ylabel("Tension (V)")
     if YMIN is not None and YMAX is not None:
@@ -99,23 +211,107 @@ def setup_plot():
     line.set_visible(True)
     points.set_visible(False)
 
-    return fig, ax, line, points, x, y
+    # fond mis en cache pour le blitting : les artistes animés ne sont pas
+    # dessinés par draw(), on les repeindra nous-mêmes par-dessus ce fond
+    # (bbox de la figure entière pour couvrir aussi la zone du titre)
+    fig.canvas.draw()
+    bg = fig.canvas.copy_from_bbox(fig.bbox)
 
-def detect_bpm(data, fs):
-    """Détecte les pics R et calcule le BPM de façon plus robuste."""
-    if len(data) < fs:  # au moins 1 seconde
-        return None
+    return fig, ax, line, points, x, y, bg
 
-    arr = np.asarray(data, dtype=float)
+def _bpm_core(arr, fs):
+    """Cœur du calcul BPM, écrit pour être compilable par Numba.
 
+    Même algorithme que la version numpy mais en boucles simples :
+    une seule passe mémoire par étape, aucun objet Python. Retourne le
+    BPM ou NaN si aucune estimation fiable.
+    """
+    n = arr.size
+
+    # ligne de base : boxcar de 0.2 s en une seule passe fusionnée, la
+    # fenêtre [lo, hi) glisse avec i (équiv. convolve 'same', zéro-paddé)
+    # sans tableau de sommes cumulées ni seconde traversée
+    win = max(1, int(0.2 * fs))
+    off = (win - 1) // 2
+    hi = min(n, off + 1)
+    lo = 0
+    wsum = 0.0
+    for j in range(hi):
+        wsum += arr[j]
+    sig = np.empty(n)
+    for i in range(n):
+        sig[i] = arr[i] - wsum / win
+        nhi = min(n, i + off + 2)
+        if nhi > hi:
+            wsum += arr[hi]
+            hi = nhi
+        nlo = max(0, i + off - win + 2)
+        if nlo > lo:
+            wsum -= arr[lo]
+            lo = nlo
+
+    # seuil adaptatif : médiane et p90 par sélection partielle, sans tri complet
+    tmp = sig.copy()
+    m = n // 2
+    med = np.partition(tmp, m)[m]
+    k90 = int(0.9 * n)
+    p90 = np.partition(tmp, k90)[k90]
+    thresh = med + 0.35 * (p90 - med)
+
+    # maxima locaux au-dessus du seuil, fusionnés à la volée (distance min 0.3 s)
+    min_dist = max(1, int(0.3 * fs))
+    peaks = np.empty(n, dtype=np.int64)
+    np_ = 0
+    for i in range(1, n - 1):
+        if sig[i] > sig[i - 1] and sig[i] > sig[i + 1] and sig[i] > thresh:
+            if np_ > 0 and (i - peaks[np_ - 1]) < min_dist:
+                if sig[i] > sig[peaks[np_ - 1]]:
+                    peaks[np_ - 1] = i
+            else:
+                peaks[np_] = i
+                np_ += 1
+    if np_ < 2:
+        return np.nan
+
+    # intervalles plausibles uniquement (0.3 à 2 s)
+    intervals = np.empty(np_ - 1)
+    ni = 0
+    for j in range(1, np_):
+        dt = (peaks[j] - peaks[j - 1]) / fs
+        if 0.3 <= dt <= 2.0:
+            intervals[ni] = dt
+            ni += 1
+    if ni == 0:
+        return np.nan
+
+    bpm = 60.0 / np.median(intervals[:ni])
+    if bpm < 30.0 or bpm > 220.0:
+        return np.nan
+    return bpm
+
+
+if HAVE_NUMBA:
+    # signature explicite : compilation à l'import (ou chargement du cache
+    # disque), pas de pic de latence JIT au premier calcul BPM en cours
+    # d'acquisition
+    _bpm_core_jit = njit("float64(float64[::1], int64)", cache=True, fastmath=True)(_bpm_core)
+
+
+def _bpm_core_np(arr, fs):
+    """Version numpy du calcul BPM (repli quand Numba est absent)."""
     # élimination de la dérive lente par moyenne mobile courte
+    # (uniform_filter1d : pas de noyau à allouer ni de temporaire convolve)
     win = max(1, int(0.2 * fs))
-    baseline = np.convolve(arr, np.ones(win) / win, mode="same")
+    baseline = uniform_filter1d(arr, size=win, mode="constant", cval=0.0)
     sig = arr - baseline
 
-    # seuil adaptatif
-    med = np.median(sig)
-    p90 = np.percentile(sig, 90)
+    # seuil adaptatif : sélection partielle (O(N)) au lieu d'un tri complet
+    tmp = sig.copy()
+    m = tmp.size // 2
+    k90 = int(0.9 * tmp.size)
+    tmp.partition((m, k90))
+    med = tmp[m]
+    p90 = tmp[k90]
     thresh = med + 0.35 * (p90 - med)
 
     # maxima locaux au-dessus du seuil
@@ -123,9 +319,12 @@ def detect_bpm(data, fs):
         (sig[1:-1] > sig[:-2]) & (sig[1:-1] > sig[2:]) & (sig[1:-1] > thresh)
     )[0] + 1
     if cand.size < 2:
-        return None
+        return np.nan
 
     # force distance minimale entre pics (évite double-comptage) : 0.3s
+    # fusion séquentielle ancrée sur le dernier pic retenu — une
+    # segmentation par écarts consécutifs fusionnerait transitivement
+    # toute chaîne de candidats rapprochés et avalerait de vrais pics R
     min_dist = max(1, int(0.3 * fs))
     peaks = []
     for c in cand:
@@ -137,34 +336,105 @@ def detect_bpm(data, fs):
             peaks.append(c)
 
     if len(peaks) < 2:
-        return None
+        return np.nan
 
     # intervalles en secondes et filtrage des intervalles aberrants
     intervals = np.diff(peaks) / float(fs)
     intervals = intervals[(intervals >= 0.3) & (intervals <= 2.0)]
     if intervals.size == 0:
-        return None
+        return np.nan
 
     bpm = 60.0 / np.median(intervals)
     if not (30 <= bpm <= 220):
+        return np.nan
+    return bpm
+
+
+def detect_bpm(data, fs):
+    """Détecte les pics R et calcule le BPM de façon plus robuste."""
+    if len(data) < fs:  # au moins 1 seconde
         return None
-    return round(bpm, 1)
+
+    arr = np.ascontiguousarray(data, dtype=np.float64)
+    bpm = _bpm_core_jit(arr, fs) if HAVE_NUMBA else _bpm_core_np(arr, fs)
+    if np.isnan(bpm):
+        return None
+    return round(float(bpm), 1)
+
+
+class BpmWorker:
+    """Détection BPM dans un thread d'arrière-plan (double buffer).
+
+    La boucle principale dépose une copie du signal via submit() et
+    relit la dernière estimation dans .bpm : le calcul ne bloque jamais
+    la lecture série ni l'affichage.
+    """
+
+    def __init__(self, fs):
+        self.fs = fs
+        self.bpm = None
+        self._snap = None
+        self._last_sig = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def submit(self, sig):
+        # fenêtre identique à la précédente (port muet) : garder le cache
+        sig_id = (sig.size, float(sig[-1]), float(sig.mean()))
+        if sig_id == self._last_sig:
+            return
+        self._last_sig = sig_id
+        # copie : la boucle principale peut continuer à écrire dans l'anneau
+        with self._lock:
+            self._snap = np.array(sig, dtype=np.float64)
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            with self._lock:
+                snap, self._snap = self._snap, None
+            if snap is None:
+                continue
+            est = detect_bpm(snap, self.fs)
+            if est:
+                self.bpm = est
 
 def main():
     ser = open_serial()
     smoother = Smoother(mode=SMOOTH_MODE, alpha=ALPHA, ma_window=MA_WINDOW)
-    fig, ax, line, points, x, y = setup_plot()
+    fig, ax, line, points, x, y, bg = setup_plot()
+    ring = RingBuffer(BUFFER_POINTS)
+    bpm_worker = BpmWorker(FS)
 
     filter_enabled = True
     display_mode = "line"  # "line" ou "points"
 
-    last_bpm_update = time.time()
+    last_bpm_update = time.monotonic()
     bpm = None
 
     def update_title():
+        # le titre est animé : le prochain blit le repeindra, pas de draw()
         status = "ON" if filter_enabled else "OFF"
         ax.set_title(f"ECG (lissé) - BPM: {bpm or '--'} | Filtre: {status} | Mode: {display_mode}")
 
+    def blit():
+        # ne repeint que les artistes animés (courbe + titre), pas tout le canevas
+        fig.canvas.restore_region(bg)
+        ax.draw_artist(line)
+        ax.draw_artist(points)
+        ax.draw_artist(ax.title)
+        fig.canvas.blit(fig.bbox)
+
+    def on_resize(event):
+        # le redimensionnement invalide le fond capturé : redraw complet
+        # puis re-capture, sinon le blit restaure un fond obsolète
+        nonlocal bg
+        fig.canvas.draw()
+        bg = fig.canvas.copy_from_bbox(fig.bbox)
+
     def on_key(event):
         nonlocal filter_enabled, display_mode
         if event.key is None:
@@ -173,52 +443,117 @@ def main():
         if key == "g":
             filter_enabled = not filter_enabled
             update_title()
-            fig.canvas.draw_idle()
+            blit()
         elif key == "d":
             display_mode = "points" if display_mode == "line" else "line"
             line.set_visible(display_mode == "line")
             points.set_visible(display_mode == "points")
             update_title()
-            fig.canvas.draw_idle()
+            blit()
 
     fig.canvas.mpl_connect("key_press_event", on_key)
+    fig.canvas.mpl_connect("resize_event", on_resize)
+
+    # abscisses fixées une fois pour toutes : la boucle ne touche qu'aux y
+    disp_x = None
+    if BUFFER_POINTS > DISPLAY_MAX_POINTS:
+        k = -(-2 * BUFFER_POINTS // DISPLAY_MAX_POINTS)
+        disp_x = np.linspace(0, BUFFER_POINTS - 1, 2 * (BUFFER_POINTS // k))
+        # ydata initial de même longueur, sinon un blit déclenché avant le
+        # premier lot série (touche g/d) ferait planter Line2D.recache
+        disp_y0 = minmax_decimate(y, DISPLAY_MAX_POINTS)
+        line.set_data(disp_x, disp_y0)
+        points.set_data(disp_x, disp_y0)
+
+    linebuf = b""
+    next_draw = 0.0
+    autoscale = YMIN is None or YMAX is None
+    last_autoscale = 0.0
+
+    # taille approximative d'un lot en octets (une ligne ASCII fait ~6 octets)
+    frame_bytes = 2 if WIRE_FORMAT == "u16" else 6
 
     try:
         while True:
+            # lecture bloquante : le noyau réveille le thread dès que le lot
+            # est complet (ou au timeout), plus de réveil toutes les 2 ms —
+            # puis on vide ce qui est arrivé entre-temps
+            chunk = ser.read(READ_BATCH * frame_bytes)
             if ser.in_waiting:
-                try:
-                    raw = ser.readline().decode(errors="ignore").strip()
-                    if not raw:
-                        continue
-                    val = float(raw)
-                except ValueError:
-                    continue
-
-                # appliquer ou bypasser le filtre
-                val = smoother.push(val) if filter_enabled else val
-
-                # faire défiler le buffer rapidement (remplace np.roll(..., out=y))
-                y[:-1] = y[1:]
-                y[-1] = val
-
-                # mise à jour minimale des artistes
-                line.set_ydata(y)
-                points.set_ydata(y)
-
-                # Calcul BPM toutes les 2 secondes (sur les valeurs valides)
-                if time.time() - last_bpm_update > 2:
-                    valid = y[~np.isnan(y)]
+                chunk += ser.read(ser.in_waiting)
+            now = time.monotonic()
+
+            if chunk:
+                linebuf += chunk
+
+                if WIRE_FORMAT == "u16":
+                    # trames binaires : conversion directe octets → volts,
+                    # l'alignement est préservé en ne consommant que des
+                    # nombres pairs d'octets
+                    nb = len(linebuf) & ~1
+                    batch = np.frombuffer(linebuf[:nb], dtype="<u2").astype(np.float64) * (ADC_VREF / ADC_MAX)
+                    linebuf = linebuf[nb:]
+                else:
+                    *lines, linebuf = linebuf.split(b"\n")
+                    vals = []
+                    for raw in lines:
+                        try:
+                            vals.append(float(raw.decode(errors="ignore").strip()))
+                        except ValueError:
+                            continue
+                    batch = np.asarray(vals, dtype=np.float64)
+
+                if batch.size:
+                    # lisser tout le lot d'un coup plutôt qu'échantillon par échantillon
+                    if filter_enabled:
+                        batch = smoother.push_batch(batch)
+
+                    # fenêtre glissante en O(1) : écriture dans l'anneau, lecture par vue
+                    ring.extend(batch)
+                    cur = ring.view()
+                    if disp_x is not None:
+                        # l'anneau complet reste la source de detect_bpm,
+                        # seul l'affichage est décimé
+                        disp = minmax_decimate(cur, DISPLAY_MAX_POINTS)
+                        line.set_ydata(disp)
+                        points.set_ydata(disp)
+                    else:
+                        line.set_ydata(cur)
+                        points.set_ydata(cur)
+
+                # Autoscale vertical (YMIN/YMAX à None) toutes les 0.5 s :
+                # min/max vectorisés sur l'anneau, une seule passe C
+                if autoscale and now - last_autoscale > 0.5:
+                    cur = ring.view()
+                    lo = np.nanmin(cur) if not np.isnan(cur[-1]) else np.nan
+                    if not np.isnan(lo):
+                        hi = np.nanmax(cur)
+                        pad = (hi - lo) * 0.15 or 0.2
+                        if (lo - pad, hi + pad) != ax.get_ylim():
+                            ax.set_ylim(lo - pad, hi + pad)
+                            # les graduations changent : re-capture du fond
+                            fig.canvas.draw()
+                            bg = fig.canvas.copy_from_bbox(fig.bbox)
+                    last_autoscale = now
+
+                # Calcul BPM toutes les 2 secondes, délégué au thread de fond
+                if now - last_bpm_update > 2:
+                    cur = ring.view()
+                    valid = cur[~np.isnan(cur)]
                     if len(valid) > FS * 2:
-                        bpm_est = detect_bpm(valid.tolist(), FS)
-                        if bpm_est:
-                            bpm = bpm_est
-                    last_bpm_update = time.time()
+                        bpm_worker.submit(valid)
+                    if bpm_worker.bpm:
+                        bpm = bpm_worker.bpm
+                    last_bpm_update = time.monotonic()
                     update_title()
 
-                # pause courte pour event loop matplotlib
-                plt.pause(0.001)
-            else:
-                time.sleep(0.002)
+                # un seul blit par période de rafraîchissement, pas par échantillon
+                if now >= next_draw:
+                    blit()
+                    next_draw = now + 1.0 / DRAW_FPS
+
+            # pomper les événements clavier/fenêtre sans plt.pause ni redraw
+            fig.canvas.flush_events()
 
     except KeyboardInterrupt:
         pass